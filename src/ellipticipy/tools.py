@@ -6,15 +6,41 @@ in the main file.
 """
 
 import numpy as np
-from scipy.integrate import cumtrapz
 
 from obspy.taup import TauPyModel
 from obspy.taup.tau import TauModel
 
+# numba is optional, used to compile the integration along the ray path
+try:
+    from numba import njit
+except ImportError:
+    njit = None
+
 # Constants
 EARTH_LOD = 86164.0905  # s, length of day of Earth
 G = 6.67408e-11  # m^3 kg^-1 s^-2, universal gravitational constant
 
+# Wave type of the legs of a seismic phase, by TauP phase name letter
+PHASE_LEG_WAVES = {
+    "P": "p",
+    "p": "p",
+    "K": "p",
+    "k": "p",
+    "I": "p",
+    "S": "s",
+    "s": "s",
+    "J": "s",
+}
+
+# Other characters allowed in a phase name when finding its wave type,
+# e.g. for interactions (c, i, m, v, ^), "diff", "ed", "n", "g", "b" and
+# interaction depths
+PHASE_OTHER_CHARACTERS = set("cimv^dfegnb0123456789.")
+
+# Schmidt semi-normalisation of the degree 2 associated Legendre
+# polynomials for orders m = 0, 1, 2
+WEIGHTED_ALP2_NORM = np.sqrt([1.0, 1.0 / 3.0, 1.0 / 12.0])
+
 
 def model_epsilon(model, lod=EARTH_LOD):
     """
@@ -26,7 +52,8 @@ def model_epsilon(model, lod=EARTH_LOD):
     :type lod: float
     :returns: Adds arrays of epsilon (ellipticity of figure)at top and
         bottom of each velocity layer as attributes
-        model.s_mod.v_mod.top_epsilon and model.s_mod.v_mod.bot_epsilon
+        model.s_mod.v_mod.top_epsilon and model.s_mod.v_mod.bot_epsilon,
+        and its gradient within each layer as model.s_mod.v_mod._epsilon_slope
     """
 
     # Angular velocity of planet
@@ -37,32 +64,33 @@ def model_epsilon(model, lod=EARTH_LOD):
 
     # Depth and density information of velocity layers
     v_mod = model.s_mod.v_mod  # velocity_model
-    top_depth = v_mod.layers["top_depth"][::-1] * 1e3  # in m
-    top_density = v_mod.layers["top_density"][::-1] * 1e3  # in kg m^-3
-    bot_density = v_mod.layers["bot_density"][::-1] * 1e3  # in kg m^-3
+    layer_properties(v_mod)
+    top_depth = v_mod._top_depth[::-1] * 1e3  # in m
     top_radius = a - top_depth
 
-    # Mass within each spherical shell by trapezoidal rule
-    top_volume = (4.0 / 3.0) * np.pi * top_radius**3
-    volume = np.zeros(len(top_depth) + 1)
-    volume[1:] = top_volume
-    d_volume = volume[1:] - volume[:-1]
-    d_mass = 0.5 * (bot_density + top_density) * d_volume
-    mass = np.cumsum(d_mass)
+    # Powers of radius
+    top_radius2 = top_radius * top_radius
+    top_radius3 = top_radius2 * top_radius
+    top_radius5 = top_radius3 * top_radius2
 
-    total_mass = mass[-1]
+    # Mean density of each layer for the trapezoidal rule, in kg m^-3
+    mean_density = v_mod.layers["bot_density"][::-1] + v_mod.layers["top_density"][::-1]
+    mean_density *= 0.5e3
+
+    # Volume and moment of inertia per unit density within each top surface
+    top_volume = (4.0 / 3.0) * np.pi * top_radius3
+    j_top = (8.0 / 15.0) * np.pi * top_radius5
 
-    # Moment of inertia of each spherical shell by trapezoidal rule
-    j_top = (8.0 / 15.0) * np.pi * top_radius**5
-    j = np.zeros(len(top_depth) + 1)
-    j[1:] = j_top
-    d_j = j[1:] - j[:-1]
-    d_inertia = 0.5 * (bot_density + top_density) * d_j
+    # Mass and moment of inertia of each spherical shell by trapezoidal
+    # rule, accumulated together in a single pass
+    shells = np.diff([top_volume, j_top], prepend=0.0, axis=-1)
+    shells *= mean_density
+    mass, moment_of_inertia = np.cumsum(shells, axis=-1, out=shells)
 
-    moment_of_inertia = np.cumsum(d_inertia)
+    total_mass = mass[-1]
 
     # Calculate y (moment of inertia factor) for surfaces within the body
-    y = moment_of_inertia / (mass * top_radius**2)
+    y = moment_of_inertia / (mass * top_radius2)
 
     # Calculate Radau's parameter
     radau = 6.25 * (1 - 3 * y / 2) ** 2 - 1
@@ -74,18 +102,27 @@ def model_epsilon(model, lod=EARTH_LOD):
     # epsilon at surface
     epsilona = (5 * ha) / (2 * radau[-1] + 4)
 
-    # Solve the differential equation
-    epsilon = np.exp(cumtrapz(radau / top_radius, x=top_radius, initial=0.0))
-    epsilon = epsilona * epsilon / epsilon[-1]
-
-    # Output as model attributes
-    r = np.zeros(len(top_radius) + 1)
-    r[1:] = top_radius
-    epsilon = np.insert(epsilon, 0, epsilon[0])  # add a centre of planet value
-    v_mod.top_epsilon = epsilon[::-1][:-1]
-    v_mod.bot_epsilon = epsilon[::-1][1:]
+    # Solve the differential equation by cumulative trapezoidal rule,
+    # working in place on a single array
+    integrand = radau / top_radius
+    epsilon = np.empty_like(integrand)
+    epsilon[0] = 0.0
+    np.add(integrand[1:], integrand[:-1], out=epsilon[1:])
+    epsilon[1:] *= 0.5 * np.diff(top_radius)
+    np.cumsum(epsilon, out=epsilon)
+    np.exp(epsilon, out=epsilon)
+    epsilon *= epsilona / epsilon[-1]
+
+    # Output as model attributes, adding a centre of planet value
+    epsilon = np.concatenate((epsilon[:1], epsilon))[::-1]
+    v_mod.top_epsilon = epsilon[:-1]
+    v_mod.bot_epsilon = epsilon[1:]
     v_mod.lod = lod
 
+    # Gradient of epsilon with depth within each layer
+    thick = v_mod._bot_depth - v_mod._top_depth
+    v_mod._epsilon_slope = (v_mod.bot_epsilon - v_mod.top_epsilon) / thick
+
 
 def get_epsilon(model, depth):
     """
@@ -94,32 +131,92 @@ def get_epsilon(model, depth):
     :param model: The tau model object
     :type model: :class:`obspy.taup.tau_model.TauModel`
     :param depth: depth(s) in km
-    :type depth: float or :class:`~numpy.ndarray`
+    :type depth: float, list or :class:`~numpy.ndarray`
     :returns: values of epsilon, ellipticity of figure
     :rtype: :class:`~numpy.ndarray`
     """
 
-    if isinstance(depth, float):
-        depth = np.array([depth])
+    depth = np.atleast_1d(np.asarray(depth, dtype=float))
 
     # Velocity model from TauModel
     v_mod = model.s_mod.v_mod
 
-    # Closest index to depth
-    top_layer_idx = v_mod.layer_number_below(0.0)[0]
-    layer_idx = top_layer_idx * np.ones(len(depth), dtype=int)
-    cond = depth > 0.0
-    if cond.any():
-        layer_idx[cond] = v_mod.layer_number_above(depth[cond])
+    # Layer containing each depth, the upper layer at a layer boundary and
+    # the top layer at the surface
+    layer_idx = np.searchsorted(v_mod._top_depth, depth, side="left") - 1
+    layer_idx = np.maximum(layer_idx, 0)
 
     # Interpolate to get epsilon value
-    layer = v_mod.layers[layer_idx]
-    thick = layer["bot_depth"] - layer["top_depth"]
-    bot_eps = v_mod.bot_epsilon[layer_idx]
+    slope = v_mod._epsilon_slope[layer_idx]
     top_eps = v_mod.top_epsilon[layer_idx]
-    slope = (bot_eps - top_eps) / thick
 
-    return slope * (depth - layer["top_depth"]) + top_eps
+    return slope * (depth - v_mod._top_depth[layer_idx]) + top_eps
+
+
+def layer_properties(v_mod):
+    """
+    Stores the layer properties of a velocity model as contiguous arrays,
+    along with the velocity gradients with depth within each layer.
+
+    :param v_mod: The velocity model object
+    :type v_mod: :class:`obspy.taup.velocity_model.VelocityModel`
+    :returns: Adds arrays of layer top and bottom depths in km, top P and S
+        velocities in km/s and P and S velocity gradients in km/s per km
+        as attributes v_mod._top_depth, v_mod._bot_depth,
+        v_mod._top_p_velocity, v_mod._top_s_velocity, v_mod._p_slope and
+        v_mod._s_slope
+    """
+
+    layers = v_mod.layers
+    v_mod._top_depth = np.ascontiguousarray(layers["top_depth"])
+    v_mod._bot_depth = np.ascontiguousarray(layers["bot_depth"])
+    v_mod._top_p_velocity = np.ascontiguousarray(layers["top_p_velocity"])
+    v_mod._top_s_velocity = np.ascontiguousarray(layers["top_s_velocity"])
+
+    thick = v_mod._bot_depth - v_mod._top_depth
+    v_mod._p_slope = (layers["bot_p_velocity"] - v_mod._top_p_velocity) / thick
+    v_mod._s_slope = (layers["bot_s_velocity"] - v_mod._top_s_velocity) / thick
+
+
+def evaluate_velocity(model, depth, waves, above):
+    """
+    Evaluates velocity for a model at specified depths and wave types.
+
+    :param model: The tau model object
+    :type model: :class:`obspy.taup.tau_model.TauModel`
+    :param depth: depths in km
+    :type depth: :class:`~numpy.ndarray`
+    :param waves: wave type at each depth, "p" or "s"
+    :type waves: :class:`~numpy.ndarray`
+    :param above: whether to use the layer above each depth, rather than
+        the layer below, if the depth is at a layer boundary
+    :type above: :class:`~numpy.ndarray`
+    :returns: velocities in km/s
+    :rtype: :class:`~numpy.ndarray`
+    """
+
+    # Velocity model from TauModel
+    v_mod = model.s_mod.v_mod
+
+    # Layer properties and velocity gradients, found once per model
+    if not hasattr(v_mod, "_p_slope"):
+        layer_properties(v_mod)
+
+    # Layer containing each depth by binary search, the lower layer at a
+    # layer boundary unless the layer above is requested
+    layer_idx = np.searchsorted(v_mod._top_depth, depth, side="right") - 1
+    layer_idx -= above & (v_mod._top_depth[layer_idx] == depth)
+    layer_idx = np.maximum(layer_idx, 0)
+
+    # Velocity at top and gradient of each layer for the wave type
+    is_s = waves == "s"
+    top_v = np.where(
+        is_s, v_mod._top_s_velocity[layer_idx], v_mod._top_p_velocity[layer_idx]
+    )
+    slope = np.where(is_s, v_mod._s_slope[layer_idx], v_mod._p_slope[layer_idx])
+
+    # Interpolate within the layer
+    return slope * (depth - v_mod._top_depth[layer_idx]) + top_v
 
 
 def weighted_alp2(m, theta):
@@ -135,22 +232,33 @@ def weighted_alp2(m, theta):
     :rtype: float
     """
 
-    # Kronecker delta
-    kronecker_0m = 1 if m == 0 else 0
+    if m not in (0, 1, 2):
+        raise ValueError("Invalid value of m")
 
-    # Pre-factor for polynomial - Schmidt semi-normalisation
-    norm = np.sqrt(
-        (2 - kronecker_0m) * (np.math.factorial(2 - m) / np.math.factorial(2 + m))
+    # Return polynomial of degree 2 and order m
+    return weighted_alp2_all(theta)[..., m]
+
+
+def weighted_alp2_all(theta):
+    """
+    The weighted degree 2 associated Legendre polynomials of all orders.
+
+    :param theta: angle(s)
+    :type theta: float or :class:`~numpy.ndarray`
+    :returns: values of weighted associated Legendre polynomials of degree 2
+        and orders m = 0, 1, 2 at x = cos(theta), along the last axis
+    :rtype: :class:`~numpy.ndarray`
+    """
+
+    cos = np.cos(theta)
+    sin = np.sin(theta)
+
+    # Polynomials of degree 2 and order m = 0, 1, 2
+    alp2 = np.stack(
+        [0.5 * (3.0 * cos * cos - 1.0), 3.0 * cos * sin, 3.0 * sin * sin], axis=-1
     )
 
-    # Return polynomial of degree 2 and order m
-    if m == 0:
-        return norm * 0.5 * (3.0 * np.cos(theta) ** 2 - 1.0)
-    if m == 1:
-        return norm * 3.0 * np.cos(theta) * np.sin(theta)
-    if m == 2:
-        return norm * 3.0 * np.sin(theta) ** 2
-    raise ValueError("Invalid value of m")
+    return WEIGHTED_ALP2_NORM * alp2
 
 
 def ellipticity_coefficients(arrivals, model=None, lod=EARTH_LOD):
@@ -197,6 +305,9 @@ def individual_ellipticity_coefficients(arrival, model, lod=EARTH_LOD):
     :type lod: float
     :returns: list of three floats, ellipticity coefficients
     :rtype: list
+
+    The coefficients are stored on the arrival, so repeated calls for the
+    same arrival, model and length of day do not recalculate them.
     """
 
     # Ensure that model is TauModel
@@ -205,21 +316,55 @@ def individual_ellipticity_coefficients(arrival, model, lod=EARTH_LOD):
     if not isinstance(model, TauModel):
         raise TypeError("Velocity model not correct type")
 
+    # Token identifying this model in coefficients stored on arrivals,
+    # so that arrivals don't hold a reference to the model itself
+    v_mod = model.s_mod.v_mod
+    if not hasattr(v_mod, "_cache_token"):
+        v_mod._cache_token = object()
+
+    # Use coefficients previously calculated for this arrival if they exist
+    cached = getattr(arrival, "_ellipticity_cache", None)
+    if cached is not None and cached[0] is v_mod._cache_token and cached[1] == lod:
+        return list(cached[2])
+
     # Calculate epsilon values if they don't already exist
-    if not hasattr(model.s_mod.v_mod, "top_epsilon") or model.s_mod.v_mod.lod != lod:
+    if not hasattr(v_mod, "top_epsilon") or v_mod.lod != lod:
         model_epsilon(model, lod)
 
-    # Coefficients from continuous ray path
-    ray_sigma = integral_coefficients(arrival, model)
+    # Split the ray path
+    paths, waves = split_ray_path(arrival, model)
 
-    # Coefficients from discontinuities
-    disc_sigma = discontinuity_coefficients(arrival, model)
+    # Coefficients from continuous ray path and from discontinuities
+    ray_sigma, disc_sigma = path_coefficients(arrival, model, paths, waves)
 
     # Sum the contribution from the ray path and the discontinuities
     # to get final coefficients
-    sigma = [ray_sigma[m] + disc_sigma[m] for m in [0, 1, 2]]
+    sigma = (ray_sigma + disc_sigma).tolist()
 
-    return sigma
+    # Store the coefficients on the arrival
+    arrival._ellipticity_cache = (v_mod._cache_token, lod, sigma)
+
+    return list(sigma)
+
+
+def discontinuity_depths(model):
+    """
+    Depths of discontinuities in a model, excluding the centre of the planet.
+
+    The depths are stored on the velocity model so that they are only found
+    once per model, rather than once per arrival.
+
+    :param model: The tau model object
+    :type model: :class:`obspy.taup.tau_model.TauModel`
+    :returns: sorted discontinuity depths in km
+    :rtype: :class:`~numpy.ndarray`
+    """
+
+    v_mod = model.s_mod.v_mod
+    if not hasattr(v_mod, "_disc_depths_cache"):
+        v_mod._disc_depths_cache = np.sort(v_mod.get_discontinuity_depths()[:-1])
+
+    return v_mod._disc_depths_cache
 
 
 def split_ray_path(arrival, model):
@@ -228,25 +373,31 @@ def split_ray_path(arrival, model):
     """
 
     # Get discontinuity depths in the model in km
-    discs = model.s_mod.v_mod.get_discontinuity_depths()[:-1]
+    discs = discontinuity_depths(model)
 
-    # Split path at discontinuity depths
+    # Find points at discontinuity depths by binary search
     full_path = arrival.path
     depths = full_path["depth"]
-    is_disc = np.isin(depths, discs)
+    disc_idx = np.minimum(np.searchsorted(discs, depths), len(discs) - 1)
+    is_disc = discs[disc_idx] == depths
     is_disc[0] = False  # Don't split on first point
-    idx = np.where(is_disc)[0]
-
-    # Split ray paths, including start and end points
-    splitted = np.split(full_path, idx)
-    dpaths = [np.append(s, splitted[i + 1][0]) for i, s in enumerate(splitted[:-1])]
-
-    # Classify the waves - P or S
-    dwaves = [classify_path(path, model) for path in dpaths]
-
-    # Construct final path list by removing diffracted segments
-    paths = [p for p, w in zip(dpaths, dwaves) if w != "diff"]
-    waves = [w for p, w in zip(dpaths, dwaves) if w != "diff"]
+    idx = np.flatnonzero(is_disc)
+
+    # Split ray paths at discontinuities as views of the full path,
+    # including start and end points
+    starts = np.concatenate(([0], idx[:-1]))
+    dpaths = [full_path[i0 : i1 + 1] for i0, i1 in zip(starts, idx)]
+
+    # Classify the waves - P or S - and construct final path list by
+    # removing diffracted segments
+    wave = phase_wave(arrival.name)
+    paths = []
+    waves = []
+    for path in dpaths:
+        path_wave = classify_path(path, model, wave)
+        if path_wave != "diff":
+            paths.append(path)
+            waves.append(path_wave)
 
     # Enforce that paths and waves are the same length
     # Something has gone wrong if not
@@ -255,6 +406,26 @@ def split_ray_path(arrival, model):
     return paths, waves
 
 
+def join_ray_path(paths, waves):
+    """
+    Join labelled ray path segments into a single path.
+
+    :param paths: ray path segments
+    :type paths: list[:class:`~numpy.ndarray`]
+    :param waves: wave type of each segment, "p" or "s"
+    :type waves: list[str]
+    :returns: joined path, wave type at each point, and indices of the
+        first and last points of each segment
+    :rtype: tuple
+    """
+
+    lengths = np.array([len(path) for path in paths])
+    ends = np.cumsum(lengths) - 1
+    starts = ends - lengths + 1
+
+    return np.concatenate(paths), np.repeat(waves, lengths), starts, ends
+
+
 def expected_delay_time(ray_param, depth0, depth1, wave, model):
     """
     Expected delay time between two depths for a given wave type (p or s).
@@ -264,16 +435,14 @@ def expected_delay_time(ray_param, depth0, depth1, wave, model):
     radius0 = model.radius_of_planet - depth0
     radius1 = model.radius_of_planet - depth1
 
-    # Velocity model from TauModel
-    v_mod = model.s_mod.v_mod
-
-    # Get velocities
-    if depth1 >= depth0:
-        v0 = v_mod.evaluate_below(depth0, wave)[0]
-        v1 = v_mod.evaluate_above(depth1, wave)[0]
-    else:
-        v0 = v_mod.evaluate_above(depth0, wave)[0]
-        v1 = v_mod.evaluate_below(depth1, wave)[0]
+    # Get velocities within the layers between the two depths
+    downgoing = depth1 >= depth0
+    v0, v1 = evaluate_velocity(
+        model,
+        np.array([depth0, depth1]),
+        np.array([wave, wave]),
+        np.array([not downgoing, downgoing]),
+    )
 
     # Calculate time for segment if velocity non-zero
     # - if velocity zero then return zero time
@@ -284,7 +453,7 @@ def expected_delay_time(ray_param, depth0, depth1, wave, model):
 
         def vertical_slowness(eta, p):
             y = eta**2 - p**2
-            return np.sqrt(y * (y > 0))  # in s
+            return np.sqrt(np.maximum(y, 0.0))  # in s
 
         n0 = vertical_slowness(eta0, ray_param)
         n1 = vertical_slowness(eta1, ray_param)
@@ -296,33 +465,62 @@ def expected_delay_time(ray_param, depth0, depth1, wave, model):
     return 0.0
 
 
-def classify_path(path, model):
+def phase_wave(name):
+    """
+    Wave type of a seismic phase, if it is the same for all legs.
+
+    :param name: TauP phase name
+    :type name: str
+    :returns: "p" or "s" if every leg of the phase is of that wave type,
+        otherwise None
+    :rtype: str or None
+    """
+
+    # Can't find the wave type from unrecognised phase names
+    if not set(name) <= set(PHASE_LEG_WAVES) | PHASE_OTHER_CHARACTERS:
+        return None
+
+    waves = {PHASE_LEG_WAVES[x] for x in name if x in PHASE_LEG_WAVES}
+    if len(waves) == 1:
+        return waves.pop()
+    return None
+
+
+def classify_path(path, model, wave=None):
     """
     Determine whether we have a p or s-wave path by comparing delay times.
+
+    If the wave type is already known from the phase name then only
+    diffracted/head wave segments need to be identified.
     """
 
     # Examine just the first two points near the shallowest part of the path
-    if path[0]["depth"] < path[-1]["depth"]:
-        point0 = path[0]
-        point1 = path[1]
+    depth = path["depth"]
+    if depth[0] < depth[-1]:
+        i0, i1 = 0, 1
     else:
-        point0 = path[-2]
-        point1 = path[-1]
+        i0, i1 = -2, -1
 
     # Ray parameter
-    ray_param = point0["p"]
+    ray_param = path["p"][i0]
 
     # Depths
-    depth0 = point0["depth"]
-    depth1 = point1["depth"]
+    depth0 = depth[i0]
+    depth1 = depth[i1]
 
     # If no change in depth then this is a diffracted/head wave segment
     if depth0 == depth1:
         return "diff"
 
+    # Wave type known from the phase name
+    if wave is not None:
+        return wave
+
     # Delay time for this segment from ObsPy ray path
-    travel_time = point1["time"] - point0["time"]
-    distance = abs(point0["dist"] - point1["dist"])
+    time = path["time"]
+    dist = path["dist"]
+    travel_time = time[i1] - time[i0]
+    distance = abs(dist[i0] - dist[i1])
     delay_time = travel_time - ray_param * distance
 
     # Get the expected delay time for each wave type
@@ -339,174 +537,171 @@ def classify_path(path, model):
     return "s"
 
 
-def integral_coefficients(arrival, model):
+def path_coefficients(arrival, model, paths, waves):
     """
-    Ellipticity coefficients due to integral along ray path.
+    Ellipticity coefficients due to integral along ray path and due to all
+    discontinuities, in a single pass over the path segments.
     """
 
-    # Split the ray path
-    paths, waves = split_ray_path(arrival, model)
-
-    # Loop through path segments
-    sigmas = []
-    for path, wave in zip(paths, waves):
+    # No contribution if every segment is diffracted
+    if not paths:
+        return np.zeros(3), np.zeros(3)
 
-        # Depth in km
-        depth = path["depth"]
-        max_depth = np.max(depth)
+    # Join the path segments into a single labelled path
+    path, wave, starts, ends = join_ray_path(paths, waves)
+    lengths = ends - starts + 1
+    segment = np.repeat(np.arange(len(starts)), lengths)
 
-        # Radius in km
-        radius = model.radius_of_planet - depth
+    # Depth in km
+    depth = path["depth"]
+    max_depth = np.maximum.reduceat(depth, starts)[segment]
 
-        # Velocity in km/s
-        v_mod = model.s_mod.v_mod
-        cond = depth != max_depth
-        v = np.zeros_like(depth)
-        v[cond] = v_mod.evaluate_below(depth[cond], wave)
-        v[~cond] = v_mod.evaluate_above(max_depth, wave)
-
-        # eta in s
-        eta = radius / v
-
-        # epsilon
-        epsilon = get_epsilon(model, depth)
-
-        # Epicentral distance in radians
-        distance = path["dist"]
-
-        # lambda
-        lam = [-(2.0 / 3.0) * weighted_alp2(m, distance) for m in [0, 1, 2]]
-
-        # Vertical slowness
-        y = eta**2 - arrival.ray_param**2
-        vertical_slowness = np.sqrt(y * (y > 0))  # in s
+    # Radius in km
+    radius = model.radius_of_planet - depth
 
-        # Make velocities for bottoming rays consistent
-        min_idx = np.argmin(radius)
-        if arrival.ray_param > 0.0 and min_idx != 0 and min_idx != (len(radius) - 1):
-            # We have a bottoming ray
-            eta[min_idx] = arrival.ray_param
-            v[min_idx] = radius[min_idx] / eta[min_idx]
-            vertical_slowness[min_idx] = 0.0
+    # Velocity in km/s, from the layer above at the deepest point of a segment
+    v = evaluate_velocity(model, depth, wave, depth == max_depth)
 
-        # the Bullen (1963) quantity d log(r)/d log(eta)
-        r_top = radius[1:]
-        r_bot = radius[:-1]
+    # eta in s
+    eta = radius / v
 
-        v_top = v[1:]
-        v_bot = v[:-1]
+    # epsilon
+    epsilon = get_epsilon(model, depth)
 
-        with np.errstate(divide="ignore"):
-            # centre of planet log(0.0) will evaluate as -np.inf, which is ok, don't warn
-            dlogr = np.log(r_top) - np.log(r_bot)
-        dlogv = np.log(v_top) - np.log(v_bot)
-        dlogr_dlogeta = 1.0 / (1.0 - dlogv / dlogr)
+    # Epicentral distance in radians
+    distance = path["dist"]
 
-        # Do the integration by trapezoidal rule
-        def integration(m):
-            integrand = epsilon * lam[m]
-            top = integrand[1:]
-            bot = integrand[:-1]
+    # lambda, one column for each order m
+    lam = -(2.0 / 3.0) * weighted_alp2_all(distance)
 
-            delta = abs(vertical_slowness[1:] - vertical_slowness[:-1])
+    # Vertical slowness
+    y = eta**2 - arrival.ray_param**2
+    vertical_slowness = np.sqrt(np.maximum(y, 0.0))  # in s
+
+    # Make velocities for bottoming rays consistent
+    if arrival.ray_param > 0.0:
+        # First point of minimum radius within each segment
+        min_radius = np.minimum.reduceat(radius, starts)[segment]
+        min_idx = np.flatnonzero(radius == min_radius)
+        min_idx = min_idx[np.diff(segment[min_idx], prepend=-1) != 0]
+
+        # We have a bottoming ray if this is not an end point
+        min_idx = min_idx[(min_idx != starts) & (min_idx != ends)]
+        eta[min_idx] = arrival.ray_param
+        v[min_idx] = radius[min_idx] / eta[min_idx]
+        vertical_slowness[min_idx] = 0.0
+
+    # Do the integration
+    ray_sigma = integrate_ray_path(radius, v, vertical_slowness, epsilon, lam, segment)
+
+    # Contributions from discontinuities at each end of the ray path
+    # segments, using the closest points to the boundary. Velocities at the
+    # end points are already on the appropriate side of the boundary.
+    idx = np.concatenate((starts, ends))
+    neighbour_idx = np.concatenate((starts + 1, ends - 1))
+
+    # If ray does not change depth then this should have no contribution,
+    # so only keep the points where it does
+    active = depth[idx] != depth[neighbour_idx]
+    idx = idx[active]
+    neighbour_idx = neighbour_idx[active]
 
-            return np.sum(0.5 * (top + bot) * (dlogr_dlogeta - 1.0) * delta)
+    # Above/below sign, positive if above
+    sign = np.sign(depth[idx] - depth[neighbour_idx])
 
-        sigmas.append([integration(m) for m in [0, 1, 2]])
+    # Sum the coefficients from all discontinuities
+    disc_sigma = (-sign * vertical_slowness[idx] * epsilon[idx]) @ lam[idx]
 
-    # Sum coefficients for each segment to get total ray path contribution
-    return [np.sum([s[m] for s in sigmas]) for m in [0, 1, 2]]
+    return ray_sigma, disc_sigma
 
 
-def discontinuity_contribution(points, phase, model):
+def _integrate_ray_path_numpy(radius, v, vertical_slowness, epsilon, lam, segment):
     """
-    Ellipticity coefficients due to an individual discontinuity.
+    Integration of ellipticity coefficients along ray path segments by
+    trapezoidal rule.
     """
 
-    # Use closest points to the boundary
-    disc_point = points[0]
-    neighbour_point = points[1]
+    # Pairs of neighbouring points within the same segment
+    bot = np.flatnonzero(segment[1:] == segment[:-1])
+    top = bot + 1
 
-    # Ray parameter
-    ray_param = disc_point["p"]
+    # the Bullen (1963) quantity d log(r)/d log(eta)
+    with np.errstate(divide="ignore"):
+        # centre of planet log(0.0) will evaluate as -np.inf, which is ok, don't warn
+        dlogr = np.log(radius[top]) - np.log(radius[bot])
+    dlogv = np.log(v[top]) - np.log(v[bot])
+    dlogr_dlogeta = 1.0 / (1.0 - dlogv / dlogr)
 
-    # Distance in radians
-    distance = disc_point["dist"]
+    # Do the integration by trapezoidal rule for all m at once
+    integrand = epsilon[:, None] * lam
+    delta = abs(vertical_slowness[top] - vertical_slowness[bot])
+    weights = 0.5 * (dlogr_dlogeta - 1.0) * delta
 
-    # Radius in km
-    depth = disc_point["depth"]
-    radius = model.radius_of_planet - depth
-    neighbour_depth = neighbour_point["depth"]
+    return weights @ (integrand[top] + integrand[bot])
 
-    # Get velocity on appropriate side of the boundary
-    if neighbour_depth >= depth:
-        v = model.s_mod.v_mod.evaluate_below(depth, phase)[0]
-    else:
-        v = model.s_mod.v_mod.evaluate_above(depth, phase)[0]
 
-    # Vertical slowness
-    eta = radius / v
-    y = eta**2 - ray_param**2
-    vertical_slowness = np.sqrt(y * (y > 0))
+def _integrate_ray_path_loop(radius, v, vertical_slowness, epsilon, lam, segment):
+    """
+    Integration of ellipticity coefficients along ray path segments by
+    trapezoidal rule, as a single loop for compilation by numba.
+    """
 
-    # If ray does not change depth then this should have no contribution
-    if neighbour_depth == depth:
-        vertical_slowness = 0.0
+    sigma = np.zeros(3)
+    for i in range(len(radius) - 1):
 
-    # Above/below sign, positive if above
-    sign = np.sign(depth - neighbour_depth)
+        # Skip pairs of points in different segments
+        if segment[i + 1] != segment[i]:
+            continue
 
-    # epsilon at this depth
-    epsilon = get_epsilon(model, depth)
+        # the Bullen (1963) quantity d log(r)/d log(eta)
+        dlogr = np.log(radius[i + 1]) - np.log(radius[i])
+        dlogv = np.log(v[i + 1]) - np.log(v[i])
+        dlogr_dlogeta = 1.0 / (1.0 - dlogv / dlogr)
 
-    # lambda at this distance
-    lam = [-(2.0 / 3.0) * weighted_alp2(m, distance) for m in [0, 1, 2]]
+        # Trapezoidal rule
+        delta = abs(vertical_slowness[i + 1] - vertical_slowness[i])
+        weight = 0.5 * (dlogr_dlogeta - 1.0) * delta
 
-    # Coefficients for this discontinuity
-    sigma = np.array([-sign * vertical_slowness * epsilon * lam[m] for m in [0, 1, 2]])
+        for m in range(3):
+            sigma[m] += weight * (
+                epsilon[i + 1] * lam[i + 1, m] + epsilon[i] * lam[i, m]
+            )
 
     return sigma
 
 
-def discontinuity_coefficients(arrival, model):
-    """
-    Ellipticity coefficients due to all discontinuities.
-    """
-
-    # Split the ray path
-    paths, waves = split_ray_path(arrival, model)
-
-    # Loop through path segments
-    sigmas = []
-    for path, wave in zip(paths, waves):
-        start_points = (path[0], path[1])
-        end_points = (path[-1], path[-2])
-
-        # Contributions from each end of the ray path segment
-        start = discontinuity_contribution(start_points, wave, model)
-        end = discontinuity_contribution(end_points, wave, model)
-
-        # Overall contribution
-        sigmas.append(start + end)
-
-    # Sum the coefficients from all discontinuities
-    disc_sigma = [np.sum([s[m] for s in sigmas]) for m in [0, 1, 2]]
-
-    return disc_sigma
+# Compile the integration if numba is available. The numpy error model
+# keeps log(0.0) at the centre of the planet as -np.inf.
+if njit is None:
+    integrate_ray_path = _integrate_ray_path_numpy
+else:
+    integrate_ray_path = njit(cache=True, error_model="numpy")(_integrate_ray_path_loop)
 
 
 def correction_from_coefficients(coefficients, azimuth, source_latitude):
     """
     Ellipticity correction given the ellipticity coefficients.
+
+    :param coefficients: ellipticity coefficients, three for each correction
+    :type coefficients: list[float] or :class:`~numpy.ndarray`
+    :param azimuth: azimuth(s) from source to receiver in degrees from N
+    :type azimuth: float or :class:`~numpy.ndarray`
+    :param source_latitude: source latitude(s) in degrees
+    :type source_latitude: float or :class:`~numpy.ndarray`
+    :returns: ellipticity correction(s) in seconds
+    :rtype: float or :class:`~numpy.ndarray`
     """
 
     # Convert latitude to colatitude
-    colatitude = np.radians(90 - source_latitude)
+    colatitude = np.radians(90 - np.asarray(source_latitude))
 
     # Convert azimuth to radians
-    azimuth = np.radians(azimuth)
-
-    return sum(
-        coefficients[m] * weighted_alp2(m, colatitude) * np.cos(m * azimuth)
-        for m in [0, 1, 2]
+    azimuth = np.radians(np.asarray(azimuth))
+
+    # Sum over orders m, broadcasting over any arrays of inputs
+    return np.sum(
+        np.asarray(coefficients)
+        * weighted_alp2_all(colatitude)
+        * np.cos(np.arange(3) * azimuth[..., None]),
+        axis=-1,
     )
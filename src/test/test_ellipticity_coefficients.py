@@ -1,3 +1,4 @@
+from ellipticipy import tools
 from ellipticipy.tools import ellipticity_coefficients
 from obspy.taup import TauPyModel
 import numpy as np
@@ -40,3 +41,40 @@ def test_ellipticity_coefficients(
     print(phase, expected_sigma, calculated_sigma)
 
     assert np.all(abs(diff) < tol)
+
+
+def test_ellipticity_coefficients_cache(monkeypatch):
+    """Test that stored coefficients are reused only for the same model and length of day."""
+    model = TauPyModel("ak135")
+    arrivals = model.get_ray_paths(124.0, 65.0, phase_list=["P"])
+    first_sigma = ellipticity_coefficients(arrivals)[0]
+
+    # Count further calculations of the path coefficients
+    calls = []
+    path_coefficients = tools.path_coefficients
+
+    def counted_path_coefficients(*args):
+        calls.append(args)
+        return path_coefficients(*args)
+
+    monkeypatch.setattr(tools, "path_coefficients", counted_path_coefficients)
+
+    # Same model and length of day is served from the cache
+    repeat_sigma = ellipticity_coefficients(arrivals)[0]
+    assert repeat_sigma == first_sigma
+    assert len(calls) == 0
+
+    # Different length of day is recalculated
+    slow_sigma = ellipticity_coefficients(arrivals, lod=2 * 86164.0905)[0]
+    assert len(calls) == 1
+    assert np.all(np.abs(slow_sigma) < np.abs(first_sigma))
+
+    # Different model is recalculated
+    prem_sigma = ellipticity_coefficients(arrivals, TauPyModel("prem").model)[0]
+    assert len(calls) == 2
+    assert prem_sigma != first_sigma
+
+    # The stored coefficients don't keep a reference to the model
+    assert not any(
+        isinstance(x, type(model.model)) for x in arrivals[0]._ellipticity_cache
+    )
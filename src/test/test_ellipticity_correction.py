@@ -1,5 +1,7 @@
 from ellipticipy import ellipticity_correction
+from ellipticipy.tools import correction_from_coefficients
 from obspy.taup import TauPyModel
+import numpy as np
 import pytest
 
 # Expected corrections are from prior calculation
@@ -40,3 +42,20 @@ def test_correction(
     print(phase, expected_correction, calculated_correction)
 
     assert abs(expected_correction - calculated_correction) < tol
+
+
+def test_correction_from_coefficients_arrays():
+    """Test corrections for arrays of receivers against individual values."""
+    coefficients = [-0.93, -0.69, -0.88]
+    azimuth = np.array([0.0, 39.0, 180.0, 300.0])
+    source_latitude = np.array([-80.0, 45.0, 0.0, 10.0])
+
+    calculated_correction = correction_from_coefficients(
+        coefficients, azimuth, source_latitude
+    )
+    expected_correction = [
+        correction_from_coefficients(coefficients, az, lat)
+        for az, lat in zip(azimuth, source_latitude)
+    ]
+
+    assert np.allclose(calculated_correction, expected_correction)
@@ -0,0 +1,46 @@
+from ellipticipy import tools
+from ellipticipy.tools import ellipticity_coefficients
+from obspy.taup import TauPyModel
+import numpy as np
+import pytest
+
+# Ray paths to integrate, including one through the centre of the planet
+test_data = [
+    ("ak135", "PKIKP", 0.0, 180.0),
+    ("ak135", "PcP", 700.0, 10.0),
+    ("prem", "SKS", 100.0, 100.0),
+    ("iasp91", "sPKiKP", 540.0, 75.0),
+]
+
+
+@pytest.mark.parametrize(
+    "model_name, phase, source_depth_in_km, distance_in_degree", test_data
+)
+def test_integrate_ray_path(
+    monkeypatch, model_name, phase, source_depth_in_km, distance_in_degree
+):
+    """Test the numpy and loop integrations against each other"""
+    results = []
+
+    def integrate_both(radius, *args):
+        numpy_sigma = tools._integrate_ray_path_numpy(radius, *args)
+        with np.errstate(divide="ignore"):
+            loop_sigma = tools._integrate_ray_path_loop(radius, *args)
+        results.append((np.min(radius), numpy_sigma, loop_sigma))
+        return numpy_sigma
+
+    monkeypatch.setattr(tools, "integrate_ray_path", integrate_both)
+
+    model = TauPyModel(model_name)
+    arrivals = model.get_ray_paths(
+        source_depth_in_km, distance_in_degree, phase_list=[phase]
+    )
+    ellipticity_coefficients(arrivals)
+
+    assert len(results) == len(arrivals)
+    if phase == "PKIKP":
+        # Ray passes through the centre of the planet, where log(0.0) is -inf
+        assert results[0][0] == 0.0
+    for _, numpy_sigma, loop_sigma in results:
+        assert np.all(np.isfinite(numpy_sigma))
+        assert np.allclose(numpy_sigma, loop_sigma, rtol=1e-12, atol=0.0)
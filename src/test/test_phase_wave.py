@@ -0,0 +1,21 @@
+from ellipticipy.tools import phase_wave
+import pytest
+
+# Expected wave types, None where the phase contains both P and S legs
+test_data = [
+    ("P", "p"),
+    ("Pdiff", "p"),
+    ("pPKiKP", "p"),
+    ("PKIKP", "p"),
+    ("PKPPKP", "p"),
+    ("ScS", "s"),
+    ("sSdiff", "s"),
+    ("SKS", None),
+    ("PKJKP", None),
+    ("P410s", None),
+]
+
+
+@pytest.mark.parametrize("phase, expected_wave", test_data)
+def test_phase_wave(phase, expected_wave):
+    assert phase_wave(phase) == expected_wave
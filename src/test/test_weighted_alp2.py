@@ -0,0 +1,13 @@
+from ellipticipy.tools import weighted_alp2, weighted_alp2_all
+import numpy as np
+
+
+def test_weighted_alp2_all():
+    """Test the vectorised polynomials against the individual orders"""
+    theta = np.linspace(0.0, np.pi, 11)
+
+    calculated = weighted_alp2_all(theta)
+    expected = np.stack([weighted_alp2(m, theta) for m in [0, 1, 2]], axis=-1)
+
+    assert calculated.shape == (len(theta), 3)
+    assert np.allclose(calculated, expected)